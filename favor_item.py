@@ -55,17 +55,31 @@ FAVOR_ITEMS: List[Dict[str, Any]] = [
     }
 ]
 
+# 商店展示用的效果描述模板，按 effect type 查表；未登记的类型显示为“特殊效果”
+EFFECT_DESCRIPTIONS: Dict[str, str] = {
+    "add_favour": "好感度 +{value}",
+    "reset_favour": "重置好感度、关系和印象",
+}
+
+# 可通过 /使用道具 直接使用的效果类型（其余道具需通过赠送礼物使用）
+USABLE_EFFECT_TYPES = frozenset({"lock_relationship", "reset_favour"})
+
 class FavorItemManager:
     def __init__(self):
         # 新增：保留原始列表用于有序显示
         self.items_list = FAVOR_ITEMS
         self.items_map = {item['item_id']: item for item in FAVOR_ITEMS}
+        self.items_by_name = {item['name']: item for item in FAVOR_ITEMS}
         logger.info(f"成功加载 {len(self.items_map)} 种好感度道具。")
 
     def get_item(self, item_id: str) -> Dict[str, Any] | None:
         """根据 item_id 获取道具信息"""
         return self.items_map.get(item_id)
 
+    def get_item_by_name(self, name: str) -> Dict[str, Any] | None:
+        """根据道具名称获取道具信息"""
+        return self.items_by_name.get(name)
+
     async def register_all_items(self, shop_api):
         """将所有定义好的道具注册到商店API中"""
         if not shop_api: